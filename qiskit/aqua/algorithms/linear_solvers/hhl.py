@@ -12,7 +12,7 @@
 
 """The HHL algorithm."""
 
-from typing import Optional, Union, Dict, Any, Tuple
+from typing import Optional, Union, Dict, Any, Tuple, List
 import logging
 from copy import deepcopy
 import numpy as np
@@ -80,6 +80,9 @@ class HHL(QuantumAlgorithm):
     Running the algorithm will execute the circuit and return the result
     vector, measured (real hardware backend) or derived (qasm_simulator) via
     state tomography or calculated from the statevector (statevector_simulator).
+    The state tomography circuits are submitted as a single job, so on Aer simulators it can
+    pay off to let them run in parallel by passing
+    ``backend_options={'max_parallel_experiments': 0}`` to the :class:`QuantumInstance`.
 
     See also https://arxiv.org/abs/0811.3171
     """
@@ -115,6 +118,9 @@ class HHL(QuantumAlgorithm):
             ValueError: Invalid input
         """
         super().__init__(quantum_instance)
+        # no copy is made for inputs that already are arrays
+        matrix = np.asarray(matrix)
+        vector = np.asarray(vector)
         if matrix.shape[0] != matrix.shape[1]:
             raise ValueError("Input matrix must be square!")
         if matrix.shape[0] != len(vector):
@@ -122,7 +128,7 @@ class HHL(QuantumAlgorithm):
                              "matrix dimension!")
         if not np.allclose(matrix, matrix.conj().T):
             raise ValueError("Input matrix must be hermitian!")
-        if np.log2(matrix.shape[0]) % 1 != 0:
+        if matrix.shape[0] & (matrix.shape[0] - 1):
             raise ValueError("Input matrix dimension must be 2**n!")
         if truncate_powerdim and orig_size is None:
             raise ValueError("Truncation to {} dimensions is not "
@@ -142,9 +148,24 @@ class HHL(QuantumAlgorithm):
         self._eigenvalue_register = None
         self._ancilla_register = None
         self._success_bit = None
+        self._hhl_skeleton = None  # type: Optional[Tuple]
         self._original_dimension = orig_size
+        self._tomo_circuits = None  # type: Optional[Tuple[List, List]]
+        self._circuit_info = None  # type: Optional[Dict[str, Any]]
+        self._transpiled_cache = {}  # type: Dict[str, Tuple[Tuple, List[QuantumCircuit]]]
+        self._resized_inputs = None  # type: Optional[Tuple[np.ndarray, np.ndarray]]
         self._ret = {}  # type: Dict[str, Any]
 
+    @QuantumAlgorithm.quantum_instance.setter
+    def quantum_instance(self, quantum_instance: Union[QuantumInstance,
+                                                       BaseBackend, Backend]) -> None:
+        """ set quantum_instance """
+        previous = self._quantum_instance
+        super(HHL, self.__class__).quantum_instance.__set__(self, quantum_instance)
+        if self._quantum_instance is not previous:
+            # circuits transpiled for the previous instance can not be reused
+            self._transpiled_cache = {}
+
     @staticmethod
     def matrix_resize(matrix: np.ndarray,
                       vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray, bool, bool]:
@@ -158,10 +179,8 @@ class HHL(QuantumAlgorithm):
         Raises:
             ValueError: invalid input
         """
-        if not isinstance(matrix, np.ndarray):
-            matrix = np.asarray(matrix)
-        if not isinstance(vector, np.ndarray):
-            vector = np.asarray(vector)
+        matrix = np.asarray(matrix)
+        vector = np.asarray(vector)
 
         if matrix.shape[0] != matrix.shape[1]:
             raise ValueError("Input matrix must be square!")
@@ -175,7 +194,7 @@ class HHL(QuantumAlgorithm):
         if orig_size is None:
             orig_size = len(vector)
 
-        is_powerdim = np.log2(matrix.shape[0]) % 1 == 0
+        is_powerdim = not matrix.shape[0] & (matrix.shape[0] - 1)
         if not is_powerdim:
             logger.warning("Input matrix does not have dimension 2**n. It "
                            "will be expanded automatically.")
@@ -202,36 +221,62 @@ class HHL(QuantumAlgorithm):
             the QuantumCircuit object for the constructed circuit
         """
 
-        q = QuantumRegister(self._num_q, name="io")
+        if self._hhl_skeleton is None:
+            self._hhl_skeleton = self._construct_skeleton()
+        skeleton, q, a, s = self._hhl_skeleton
+
         qc = QuantumCircuit(q)
 
         # InitialState
         qc += self._init_state.construct_circuit("circuit", q)
 
-        # EigenvalueEstimation (QPE)
-        qc += self._eigs.construct_circuit("circuit", q)
-        a = self._eigs._output_register
-
-        # Reciprocal calculation with rotation
-        qc += self._reciprocal.construct_circuit("circuit", a)
-        s = self._reciprocal._anc
-
-        # Inverse EigenvalueEstimation
-        qc += self._eigs.construct_inverse("circuit", self._eigs._circuit)
+        # Eigenvalue estimation, reciprocal rotation and its uncomputation
+        qc += skeleton
 
         # Measurement of the ancilla qubit
+        c = None
         if measurement:
             c = ClassicalRegister(1)
             qc.add_register(c)
             qc.measure(s, c)
-            self._success_bit = c
 
         self._io_register = q
         self._eigenvalue_register = a
         self._ancilla_register = s
+        self._success_bit = c
         self._circuit = qc
+        # circuits derived from a previous construction are stale now
+        self._tomo_circuits = None
+        self._circuit_info = None
+        self._transpiled_cache = {}
         return qc
 
+    def _construct_skeleton(self) -> Tuple[QuantumCircuit, QuantumRegister,
+                                           QuantumRegister, QuantumRegister]:
+        """Construct the part of the HHL circuit following the state preparation.
+
+        It does not depend on the input vector, so it is only built once and
+        reused by every call to :meth:`construct_circuit`.
+
+        Returns:
+            the circuit, the io register, the eigenvalue register and the ancillary register
+        """
+        q = QuantumRegister(self._num_q, name="io")
+        qc = QuantumCircuit(q)
+
+        # EigenvalueEstimation (QPE)
+        qc += self._eigs.construct_circuit("circuit", q)
+        a = self._eigs._output_register
+
+        # Reciprocal calculation with rotation
+        qc += self._reciprocal.construct_circuit("circuit", a)
+        s = self._reciprocal._anc
+
+        # Inverse EigenvalueEstimation
+        qc += self._eigs.construct_inverse("circuit", self._eigs._circuit)
+
+        return qc, q, a, s
+
     @staticmethod
     def expand_to_powerdim(matrix: np.ndarray, vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """ Expand a matrix to the next-larger 2**n dimensional matrix with
@@ -246,14 +291,11 @@ class HHL(QuantumAlgorithm):
            the expanded matrix, the expanded vector
         """
         mat_dim = matrix.shape[0]
-        next_higher = int(np.ceil(np.log2(mat_dim)))
-        new_matrix = np.identity(2 ** next_higher)
-        new_matrix = np.array(new_matrix, dtype=complex)
-        new_matrix[:mat_dim, :mat_dim] = matrix[:, :]
-        matrix = new_matrix
-        new_vector = np.zeros((1, 2 ** next_higher))
-        new_vector[0, :vector.shape[0]] = vector
-        vector = new_vector.reshape(np.shape(new_vector)[1])
+        pad = (1 << (mat_dim - 1).bit_length()) - mat_dim
+        matrix = np.pad(matrix.astype(complex, copy=False), ((0, pad), (0, pad)))
+        tail = np.arange(mat_dim, mat_dim + pad)
+        matrix[tail, tail] = 1
+        vector = np.pad(vector, (0, pad))
         return matrix, vector
 
     @staticmethod
@@ -269,20 +311,15 @@ class HHL(QuantumAlgorithm):
         Returns:
             the expanded matrix, the expanded vector
         """
-        #
         half_dim = matrix.shape[0]
         full_dim = 2 * half_dim
-        new_matrix = np.zeros([full_dim, full_dim])
-        new_matrix = np.array(new_matrix, dtype=complex)
-        new_matrix[0:half_dim, half_dim:full_dim] = matrix[:, :]
-        new_matrix[half_dim:full_dim, 0:half_dim] = matrix.conj().T[:, :]
-        matrix = new_matrix
-        new_vector = np.zeros((1, full_dim))
-        new_vector = np.array(new_vector, dtype=complex)
-        new_vector[0, :vector.shape[0]] = vector.conj()
-        new_vector[0, vector.shape[0]:] = vector
-        vector = new_vector.reshape(np.shape(new_vector)[1])
-        return matrix, vector
+        new_matrix = np.zeros((full_dim, full_dim), dtype=complex)
+        new_matrix[:half_dim, half_dim:] = matrix
+        new_matrix[half_dim:, :half_dim] = matrix.conj().T
+        new_vector = np.empty(full_dim, dtype=complex)
+        new_vector[:half_dim] = vector.conj()
+        new_vector[half_dim:] = vector
+        return new_matrix, new_vector
 
     def _resize_vector(self, vec: np.ndarray) -> np.ndarray:
         if self._truncate_hermitian:
@@ -307,20 +344,31 @@ class HHL(QuantumAlgorithm):
             matrix = new_matrix
         return matrix
 
+    def _get_resized_inputs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the matrix and vector of the original problem, computed only once."""
+        if self._resized_inputs is None:
+            self._resized_inputs = (self._resize_matrix(self._matrix),
+                                    self._resize_vector(self._vector))
+        return self._resized_inputs
+
     def _statevector_simulation(self) -> None:
         """The statevector simulation.
 
         The HHL result gets extracted from the statevector. Only for
         statevector simulator available.
         """
-        res = self._quantum_instance.execute(self._circuit)
+        res = self._execute('statevector', [self._circuit])
         sv = np.asarray(res.get_statevector(self._circuit))
         # Extract solution vector from statevector
         vec = self._reciprocal.sv_to_resvec(sv, self._num_q)
         # remove added dimensions
-        self._ret['probability_result'] = \
-            np.real(self._resize_vector(vec).dot(self._resize_vector(vec).conj()))
-        vec = vec / np.linalg.norm(vec)
+        res_vec = self._resize_vector(vec)
+        self._ret['probability_result'] = np.vdot(res_vec, res_vec).real
+        if len(res_vec) == len(vec):
+            norm = np.sqrt(self._ret['probability_result'])
+        else:
+            norm = np.linalg.norm(vec)
+        vec = vec / norm
         self._hhl_results(vec)
 
     def _state_tomography(self) -> None:
@@ -331,26 +379,22 @@ class HHL(QuantumAlgorithm):
         """
 
         # Preparing the state tomography circuits
-        tomo_circuits = state_tomography_circuits(self._circuit,
-                                                  self._io_register)
-        tomo_circuits_noanc = deepcopy(tomo_circuits)
-        ca = ClassicalRegister(1)
-        for circ in tomo_circuits:
-            circ.add_register(ca)
-            circ.measure(self._reciprocal._anc, ca[0])
+        if self._tomo_circuits is None:
+            tomo_circuits = state_tomography_circuits(self._circuit,
+                                                      self._io_register)
+            tomo_circuits_noanc = deepcopy(tomo_circuits)
+            ca = ClassicalRegister(1)
+            for circ in tomo_circuits:
+                circ.add_register(ca)
+                circ.measure(self._reciprocal._anc, ca[0])
+            self._tomo_circuits = (tomo_circuits, tomo_circuits_noanc)
+        tomo_circuits, tomo_circuits_noanc = self._tomo_circuits
 
         # Extracting the probability of successful run
-        results = self._quantum_instance.execute(tomo_circuits)
-        probs = []
-        for circ in tomo_circuits:
-            counts = results.get_counts(circ)
-            s, f = 0, 0
-            for k, v in counts.items():
-                if k[0] == "1":
-                    s += v
-                else:
-                    f += v
-            probs.append(s / (f + s))
+        results = self._execute('tomography', tomo_circuits)
+        probs = np.empty(len(tomo_circuits))
+        for i, circ in enumerate(tomo_circuits):
+            probs[i] = self._success_probability(results.get_counts(circ))
         probs = self._resize_vector(probs)
         self._ret["probability_result"] = np.real(probs)
 
@@ -362,6 +406,29 @@ class HHL(QuantumAlgorithm):
         vec = np.sqrt(np.diag(rho_fit))
         self._hhl_results(vec)
 
+    def _execute(self, key: str, circuits: List[QuantumCircuit]) -> Any:
+        """Executes the circuits, reusing their transpilation across runs.
+
+        The transpiled circuits are cached under ``key`` together with the transpiler
+        settings they were produced with. They are transpiled again when these
+        settings change, and dropped when the HHL circuit is constructed again or
+        another quantum instance is set.
+        """
+        settings = (dict(self._quantum_instance.compile_config),
+                    dict(self._quantum_instance.backend_config))
+        cached = self._transpiled_cache.get(key)
+        if cached is None or cached[0] != settings:
+            cached = (settings, self._quantum_instance.transpile(circuits))
+            self._transpiled_cache[key] = cached
+        return self._quantum_instance.execute(cached[1], had_transpiled=True)
+
+    @staticmethod
+    def _success_probability(counts: Dict[str, int]) -> float:
+        """Returns the fraction of shots with the ancillary qubit measured to 1."""
+        values = np.fromiter(counts.values(), dtype=float, count=len(counts))
+        success = np.fromiter((k[0] == '1' for k in counts), dtype=bool, count=len(counts))
+        return values[success].sum() / values.sum()
+
     def _tomo_postselect(self, results: Any) -> Any:
         new_results = deepcopy(results)
 
@@ -390,27 +457,34 @@ class HHL(QuantumAlgorithm):
 
     def _hhl_results(self, vec: np.ndarray) -> None:
         res_vec = self._resize_vector(vec)
-        in_vec = self._resize_vector(self._vector)
-        matrix = self._resize_matrix(self._matrix)
+        matrix, in_vec = self._get_resized_inputs()
         self._ret["output"] = res_vec
         # Rescaling the output vector to the real solution vector
         tmp_vec = matrix.dot(res_vec)
         f1 = np.linalg.norm(in_vec) / np.linalg.norm(tmp_vec)
-        # "-1+1" to fix angle error for -0.-0.j
-        f2 = sum(np.angle(in_vec * tmp_vec.conj() - 1 + 1)) / (np.log2(matrix.shape[0]))
+        prod = in_vec * tmp_vec.conj()
+        # adding 0 turns -0.-0.j into 0.+0.j, whose angle is 0 rather than -pi
+        prod += 0
+        f2 = np.angle(prod).sum() / (np.log2(matrix.shape[0]))
         self._ret["solution"] = f1 * res_vec * np.exp(-1j * f2)
 
     def _run(self) -> 'HHLResult':
-        if self._quantum_instance.is_statevector:
+        # the circuit only depends on the inputs given at construction, so it
+        # is built once and reused on subsequent runs
+        if self._circuit is None or self._success_bit is not None:
             self.construct_circuit(measurement=False)
+        if self._quantum_instance.is_statevector:
             self._statevector_simulation()
         else:
-            self.construct_circuit(measurement=False)
             self._state_tomography()
         # Adding a bit of general result information
-        self._ret["matrix"] = self._resize_matrix(self._matrix)
-        self._ret["vector"] = self._resize_vector(self._vector)
-        self._ret["circuit_info"] = circuit_to_dag(self._circuit).properties()
+        matrix, vector = self._get_resized_inputs()
+        # copies, so that changes to the result do not leak into later runs
+        self._ret["matrix"] = matrix.copy()
+        self._ret["vector"] = vector.copy()
+        if self._circuit_info is None:
+            self._circuit_info = circuit_to_dag(self._circuit).properties()
+        self._ret["circuit_info"] = dict(self._circuit_info)
 
         ls_result = LinearsolverResult()
         ls_result.solution = self._ret['solution']
@@ -89,11 +89,9 @@ class LongDivision(Reciprocal):
 
     def sv_to_resvec(self, statevector, num_q):
         half = int(len(statevector) / 2)
-        sv_good = statevector[half:]
-        vec = np.array([])
-        for i in range(2 ** num_q):
-            vec = np.append(vec, sum(x for x in sv_good[i::2 ** num_q]))
-        return vec
+        sv_good = np.asarray(statevector[half:])
+        # entry i of the result sums all amplitudes whose index is i modulo 2**num_q
+        return sv_good.reshape(-1, 2 ** num_q).sum(axis=0)
 
     def _ld_circuit(self):
 
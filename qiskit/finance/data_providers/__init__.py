@@ -53,15 +53,41 @@ Data Providers
 
 """
 
+import sys
+import importlib
+
 from ._base_data_provider import BaseDataProvider, StockMarket
-from .data_on_demand_provider import DataOnDemandProvider
-from .exchange_data_provider import ExchangeDataProvider
-from .wikipedia_data_provider import WikipediaDataProvider
-from .yahoo_data_provider import YahooDataProvider
-from .random_data_provider import RandomDataProvider
+
+# The providers pull in their (optional) service libraries on import, so they
+# are only loaded when first accessed.
+_LAZY_PROVIDERS = {
+    'DataOnDemandProvider': '.data_on_demand_provider',
+    'ExchangeDataProvider': '.exchange_data_provider',
+    'WikipediaDataProvider': '.wikipedia_data_provider',
+    'YahooDataProvider': '.yahoo_data_provider',
+    'RandomDataProvider': '.random_data_provider',
+}
 
 __all__ = [
     'BaseDataProvider', 'StockMarket', 'RandomDataProvider',
     'DataOnDemandProvider', 'ExchangeDataProvider', 'WikipediaDataProvider',
     'YahooDataProvider'
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_PROVIDERS:
+        provider = getattr(importlib.import_module(_LAZY_PROVIDERS[name], __name__), name)
+        globals()[name] = provider
+        return provider
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_PROVIDERS))
+
+
+if sys.version_info < (3, 7):
+    # module level __getattr__ (PEP 562) is only supported from Python 3.7 on
+    for _name in _LAZY_PROVIDERS:
+        __getattr__(_name)
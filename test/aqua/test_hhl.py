@@ -14,6 +14,7 @@
 
 import warnings
 import unittest
+from unittest.mock import patch
 from test.aqua import QiskitAquaTestCase
 
 import numpy as np
@@ -420,6 +421,58 @@ class TestHHL(QiskitAquaTestCase):
         self.log.debug('fidelity HHL to algebraic: %s', fidelity)
         self.log.debug('probability of result:     %s', hhl_result.probability_result)
 
+    @data('statevector_simulator', 'qasm_simulator')
+    def test_hhl_repeated_run(self, backend_name):
+        """ hhl repeated run test """
+        self.log.debug('Testing HHL circuit reuse over repeated runs with %s', backend_name)
+
+        matrix = [[1, 0], [0, 1]]
+        vector = [1, 0.1]
+
+        # run NumPyLSsolver
+        ref_result = NumPyLSsolver(matrix, vector).run()
+        ref_solution = ref_result.solution
+        ref_normed = ref_solution / np.linalg.norm(ref_solution)
+
+        # run hhl
+        orig_size = len(vector)
+        matrix, vector, truncate_powerdim, truncate_hermitian = HHL.matrix_resize(matrix, vector)
+        eigs = TestHHL._create_eigs(matrix, 3, False)
+        num_q, num_a = eigs.get_register_sizes()
+        init_state = Custom(num_q, state_vector=vector)
+        reci = LookupRotation(negative_evals=eigs._negative_evals,
+                              scale=0.5, evo_time=eigs._evo_time)
+
+        algo = HHL(matrix, vector, truncate_powerdim, truncate_hermitian, eigs,
+                   init_state, reci, num_q, num_a, orig_size)
+        quantum_instance = QuantumInstance(BasicAer.get_backend(backend_name), shots=1000,
+                                           seed_simulator=aqua_globals.random_seed,
+                                           seed_transpiler=aqua_globals.random_seed)
+        with patch.object(quantum_instance, 'transpile',
+                          wraps=quantum_instance.transpile) as transpile:
+            first_result = algo.run(quantum_instance)
+            circuit = algo._circuit
+            tomo_circuits = algo._tomo_circuits
+            second_result = algo.run(quantum_instance)
+
+            # circuits and their transpilation are reused
+            self.assertIs(algo._circuit, circuit)
+            self.assertIs(algo._tomo_circuits, tomo_circuits)
+            self.assertEqual(transpile.call_count, 1)
+            np.testing.assert_array_almost_equal(first_result.solution, second_result.solution)
+            np.testing.assert_array_almost_equal(first_result.probability_result,
+                                                 second_result.probability_result)
+
+            # changed transpiler settings invalidate the cached transpilation
+            quantum_instance.set_config(basis_gates=['u1', 'u2', 'u3', 'cx'])
+            third_result = algo.run(quantum_instance)
+            self.assertEqual(transpile.call_count, 2)
+
+        hhl_solution = third_result.solution
+        hhl_normed = hhl_solution / np.linalg.norm(hhl_solution)
+        fidelity = state_fidelity(ref_normed, hhl_normed)
+        np.testing.assert_approx_equal(fidelity, 1, significant=1)
+
 
 if __name__ == '__main__':
     unittest.main()